@@ -2,6 +2,7 @@
 
 import datetime
 import json
+import os
 import secrets
 from fastapi import Request, HTTPException
 from fastapi.responses import HTMLResponse
@@ -15,10 +16,8 @@ from integrations.integration_item import IntegrationItem
 
 from redis_client import add_key_value_redis, get_value_redis, delete_key_redis
 
-# CLIENT_ID = 'XXX'
-# CLIENT_SECRET = 'XXX'
-CLIENT_ID = '329147ef-ac8b-4863-bced-77b7b195258f'
-CLIENT_SECRET = 'e59aec7edddef2edf4388ef611b151ab5fc85c61f828df909c147085e8ffb4f1'
+CLIENT_ID = os.environ.get('AIRTABLE_CLIENT_ID', 'XXX')
+CLIENT_SECRET = os.environ.get('AIRTABLE_CLIENT_SECRET', 'XXX')
 REDIRECT_URI = 'http://localhost:8000/integrations/airtable/oauth2callback'
 authorization_url = f'https://airtable.com/oauth2/v1/authorize?client_id={CLIENT_ID}&response_type=code&owner=user&redirect_uri=http%3A%2F%2Flocalhost%3A8000%2Fintegrations%2Fairtable%2Foauth2callback'
 
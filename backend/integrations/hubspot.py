@@ -1,23 +1,257 @@
-# slack.py
+# hubspot.py
 
-from fastapi import Request
+import logging
+import os
+import secrets
+from typing import AsyncIterator
+from fastapi import Request, HTTPException
+from fastapi.responses import HTMLResponse
+import httpx
+import asyncio
+import hashlib
+import hmac
+import math
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote
+import ijson
+import orjson
+from aiolimiter import AsyncLimiter
+from integrations.integration_item import IntegrationItem
+
+from redis_client import add_key_value_redis, get_and_delete_key_redis
+
+logger = logging.getLogger(__name__)
+
+CLIENT_ID = os.environ.get('HUBSPOT_CLIENT_ID', 'XXX')
+CLIENT_SECRET = os.environ.get('HUBSPOT_CLIENT_SECRET', 'XXX')
+STATE_SECRET = os.environ.get('HUBSPOT_STATE_SECRET', '').encode()
+if not STATE_SECRET:
+    logger.warning(
+        'HUBSPOT_STATE_SECRET is not set; using a per-process random key. OAuth callbacks '
+        'handled by another worker or after a restart will fail with "State does not match."'
+    )
+    STATE_SECRET = secrets.token_bytes(32)
+REDIRECT_URI = 'http://localhost:8000/integrations/hubspot/oauth2callback'
+AUTHORIZATION_URL = 'https://app.hubspot.com/oauth/authorize'
+scope = 'crm.objects.companies.read crm.objects.contacts.read'
+# Only the state varies between authorize calls, so the rest of the URL is built once.
+_AUTH_URL_PREFIX = (
+    f'{AUTHORIZATION_URL}?client_id={CLIENT_ID}&scope={quote(scope)}'
+    f'&redirect_uri={quote(REDIRECT_URI, safe="")}&response_type=code&state='
+)
+
+COMPANIES_URL = 'https://api.hubapi.com/crm/v3/objects/companies'
+CONTACTS_URL = 'https://api.hubapi.com/crm/v3/objects/contacts'
+COMPANY_PROPERTIES = ('name',)
+CONTACT_PROPERTIES = ('firstname', 'lastname', 'email')
+PAGE_LIMIT = 100
+MAX_ATTEMPTS = 5
+MAX_RETRY_DELAY = 60
+
+# Shared client so HubSpot API calls reuse pooled keep-alive connections
+# instead of paying a fresh TCP+TLS handshake per request. Everything goes to
+# api.hubapi.com, so with HTTP/2 concurrent fetches multiplex over one socket.
+_HUBSPOT_CLIENT = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    timeout=30.0,
+)
+# Bounds open HubSpot responses across all object types (a slot is held until
+# the streamed body is parsed and closed), while the limiter keeps the overall
+# request rate within HubSpot's 100 requests / 10 seconds.
+_HUBSPOT_SEMAPHORE = asyncio.Semaphore(10)
+_HUBSPOT_LIMITER = AsyncLimiter(100, 10)
+
+def _sign_state(nonce: str) -> str:
+    return hmac.new(STATE_SECRET, nonce.encode(), hashlib.sha256).hexdigest()[:16]
 
 async def authorize_hubspot(user_id, org_id):
-    # TODO
-    pass
+    nonce = secrets.token_urlsafe(32)
+    encoded_state = f'{nonce}.{_sign_state(nonce)}'
+
+    auth_url = _AUTH_URL_PREFIX + encoded_state
+    await add_key_value_redis(
+        f'hubspot_state:{nonce}', orjson.dumps({'user_id': user_id, 'org_id': org_id}), expire=600
+    )
+
+    return auth_url
 
 async def oauth2callback_hubspot(request: Request):
-    # TODO
-    pass
+    if request.query_params.get('error'):
+        raise HTTPException(status_code=400, detail=request.query_params.get('error_description'))
+    code = request.query_params.get('code')
+    if not code:
+        raise HTTPException(status_code=400, detail='Missing authorization code.')
+    encoded_state = request.query_params.get('state') or ''
+    nonce, _, signature = encoded_state.partition('.')
+
+    if not hmac.compare_digest(signature.encode(), _sign_state(nonce).encode()):
+        raise HTTPException(status_code=400, detail='State does not match.')
+
+    saved_state = await get_and_delete_key_redis(f'hubspot_state:{nonce}')
+
+    if not saved_state:
+        raise HTTPException(status_code=400, detail='State does not match.')
+    state_data = orjson.loads(saved_state)
+    user_id = state_data.get('user_id')
+    org_id = state_data.get('org_id')
+
+    response = await _HUBSPOT_CLIENT.post(
+        'https://api.hubapi.com/oauth/v1/token',
+        data={
+            'grant_type': 'authorization_code',
+            'code': code,
+            'redirect_uri': REDIRECT_URI,
+            'client_id': CLIENT_ID,
+            'client_secret': CLIENT_SECRET,
+        },
+        headers={
+            'Content-Type': 'application/x-www-form-urlencoded',
+        }
+    )
+
+    if response.status_code != 200:
+        raise HTTPException(status_code=400, detail='Failed to exchange HubSpot authorization code.')
+
+    await add_key_value_redis(f'hubspot_credentials:{org_id}:{user_id}', response.content, expire=600)
+
+    close_window_script = """
+    <html>
+        <script>
+            window.close();
+        </script>
+    </html>
+    """
+    return HTMLResponse(content=close_window_script)
 
 async def get_hubspot_credentials(user_id, org_id):
-    # TODO
-    pass
+    credentials = await get_and_delete_key_redis(f'hubspot_credentials:{org_id}:{user_id}')
+    if not credentials:
+        raise HTTPException(status_code=400, detail='No credentials found.')
+
+    return orjson.loads(credentials)
+
+def _retry_delay(retry_after, attempt: int) -> float:
+    """Seconds to wait before the next attempt, honouring Retry-After as seconds or an HTTP-date"""
+    delay = None
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                delay = None
+    if delay is None or not math.isfinite(delay):
+        delay = 2 ** attempt + random.random()
+    return min(max(delay, 0), MAX_RETRY_DELAY)
+
+async def _send_with_retry(request: httpx.Request) -> httpx.Response:
+    """Send a streamed request to the HubSpot API, retrying rate-limited and server errors"""
+    for attempt in range(MAX_ATTEMPTS):
+        async with _HUBSPOT_LIMITER:
+            response = await _HUBSPOT_CLIENT.send(request, stream=True)
+
+        if attempt == MAX_ATTEMPTS - 1:
+            break
+        if response.status_code == 429:
+            delay = _retry_delay(response.headers.get('Retry-After'), attempt)
+        elif response.status_code >= 500:
+            delay = _retry_delay(None, attempt)
+        else:
+            break
+        await response.aclose()
+        await asyncio.sleep(delay)
+
+    return response
+
+async def _iter_json_events(response: httpx.Response) -> AsyncIterator[tuple]:
+    """Incrementally parse a streamed JSON body into ijson (prefix, event, value) events"""
+    events = ijson.sendable_list()
+    parser = ijson.parse_coro(events)
+    async for chunk in response.aiter_bytes():
+        parser.send(chunk)
+        for event in events:
+            yield event
+        del events[:]
+    parser.close()
+    for event in events:
+        yield event
+
+def _item_name(properties: dict):
+    """Companies carry a name; contacts are named by first/last name, falling back to email"""
+    if properties.get('name'):
+        return properties['name']
+    full_name = ' '.join(filter(None, (properties.get('firstname'), properties.get('lastname'))))
+    return full_name or properties.get('email')
+
+async def _stream_items(
+    access_token: str, url: str, type: str, properties: tuple
+) -> AsyncIterator[IntegrationItem]:
+    """Streaming the CRM objects for one HubSpot object type, page by page"""
+    headers = {'Authorization': f'Bearer {access_token}'}
+    property_prefixes = {f'results.item.properties.{name}': name for name in properties}
+    after = None
+    while True:
+        params = {'limit': PAGE_LIMIT, 'properties': ','.join(properties)}
+        if after is not None:
+            params['after'] = after
+        request = _HUBSPOT_CLIENT.build_request('GET', url, headers=headers, params=params)
+
+        async with _HUBSPOT_SEMAPHORE:
+            response = await _send_with_retry(request)
+            try:
+                if response.status_code != 200:
+                    raise HTTPException(status_code=response.status_code, detail=f'Failed to fetch HubSpot {type} items.')
+
+                after = item_id = None
+                item_properties = {}
+                async for prefix, event, value in _iter_json_events(response):
+                    if prefix == 'results.item.id':
+                        item_id = value
+                    elif prefix in property_prefixes:
+                        item_properties[property_prefixes[prefix]] = value
+                    elif prefix == 'results.item' and event == 'end_map':
+                        yield IntegrationItem(id=item_id, name=_item_name(item_properties), type=type)
+                        item_id = None
+                        item_properties = {}
+                    elif prefix == 'paging.next.after':
+                        after = value
+            finally:
+                await response.aclose()
+
+        if after is None:
+            break
+
+async def _fetch_items(access_token: str, url: str, type: str, properties: tuple) -> list[IntegrationItem]:
+    """Fetching the list of CRM objects for one HubSpot object type"""
+    return [item async for item in _stream_items(access_token, url, type, properties)]
+
+async def get_items_hubspot(credentials: dict) -> list[IntegrationItem]:
+    """Aggregates all metadata relevant for a hubspot integration"""
+    access_token = credentials.get('access_token')
+    if not access_token:
+        raise HTTPException(status_code=400, detail='No access token found in credentials.')
+
+    tasks = [
+        asyncio.create_task(_fetch_items(access_token, COMPANIES_URL, 'Company', COMPANY_PROPERTIES)),
+        asyncio.create_task(_fetch_items(access_token, CONTACTS_URL, 'Contact', CONTACT_PROPERTIES)),
+    ]
+    try:
+        companies, contacts = await asyncio.gather(*tasks)
+    except BaseException:
+        # Don't leave the other fetch holding a streamed response and a rate-limit slot.
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    list_of_integration_item_metadata = companies + contacts
 
-async def create_integration_item_metadata_object(response_json):
-    # TODO
-    pass
+    logger.debug('fetched %d hubspot items', len(list_of_integration_item_metadata))
+    return list_of_integration_item_metadata
 
-async def get_items_hubspot(credentials):
-    # TODO
-    pass
\ No newline at end of file
+async def close_hubspot_client():
+    await _HUBSPOT_CLIENT.aclose()
@@ -1,35 +1,23 @@
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional, List
 
+# slots=True needs Python 3.10+. A dataclass (rather than hand-written __slots__)
+# keeps FastAPI's jsonable_encoder working, since slotted objects have no vars().
+# eq=False keeps identity equality and hashing, as with the original plain class.
+@dataclass(slots=True, eq=False)
 class IntegrationItem:
-    def __init__(
-        self,
-        id: Optional[str] = None,
-        type: Optional[str] = None,
-        directory: bool = False,
-        parent_path_or_name: Optional[str] = None,
-        parent_id: Optional[str] = None,
-        name: Optional[str] = None,
-        creation_time: Optional[datetime] = None,
-        last_modified_time: Optional[datetime] = None,
-        url: Optional[str] = None,
-        children: Optional[List[str]] = None,
-        mime_type: Optional[str] = None,
-        delta: Optional[str] = None,
-        drive_id: Optional[str] = None,
-        visibility: Optional[bool] = True,
-    ):
-        self.id = id
-        self.type = type
-        self.directory = directory
-        self.parent_path_or_name = parent_path_or_name
-        self.parent_id = parent_id
-        self.name = name
-        self.creation_time = creation_time
-        self.last_modified_time = last_modified_time
-        self.url = url
-        self.children = children
-        self.mime_type = mime_type
-        self.delta = delta
-        self.drive_id = drive_id
-        self.visibility = visibility
+    id: Optional[str] = None
+    type: Optional[str] = None
+    directory: bool = False
+    parent_path_or_name: Optional[str] = None
+    parent_id: Optional[str] = None
+    name: Optional[str] = None
+    creation_time: Optional[datetime] = None
+    last_modified_time: Optional[datetime] = None
+    url: Optional[str] = None
+    children: Optional[List[str]] = None
+    mime_type: Optional[str] = None
+    delta: Optional[str] = None
+    drive_id: Optional[str] = None
+    visibility: Optional[bool] = True
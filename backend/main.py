@@ -1,9 +1,10 @@
-from fastapi import FastAPI, Form, Request
+import orjson
+from fastapi import FastAPI, Form, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 
 from integrations.airtable import authorize_airtable, get_items_airtable, oauth2callback_airtable, get_airtable_credentials
 from integrations.notion import authorize_notion, get_items_notion, oauth2callback_notion, get_notion_credentials
-from integrations.hubspot import authorize_hubspot, get_hubspot_credentials, get_items_hubspot, oauth2callback_hubspot
+from integrations.hubspot import authorize_hubspot, get_hubspot_credentials, get_items_hubspot, oauth2callback_hubspot, close_hubspot_client
 
 app = FastAPI()
 
@@ -19,6 +20,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event('shutdown')
+async def shutdown_event():
+    await close_hubspot_client()
+
 @app.get('/')
 def read_root():
     return {'Ping': 'Pong'}
@@ -74,4 +79,10 @@ async def get_hubspot_credentials_integration(user_id: str = Form(...), org_id:
 
 @app.post('/integrations/hubspot/get_hubspot_items')
 async def load_slack_data_integration(credentials: str = Form(...)):
+    try:
+        credentials = orjson.loads(credentials)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail='Invalid credentials.')
+    if not isinstance(credentials, dict):
+        raise HTTPException(status_code=400, detail='Invalid credentials.')
     return await get_items_hubspot(credentials)
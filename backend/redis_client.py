@@ -6,12 +6,17 @@ redis_host = safequote(os.environ.get('REDIS_HOST', 'localhost'))
 redis_client = redis.Redis(host=redis_host, port=6379, db=0)
 
 async def add_key_value_redis(key, value, expire=None):
-    await redis_client.set(key, value)
-    if expire:
-        await redis_client.expire(key, expire)
+    await redis_client.set(key, value, ex=expire)
 
 async def get_value_redis(key):
     return await redis_client.get(key)
 
 async def delete_key_redis(key):
     await redis_client.delete(key)
+
+async def get_and_delete_key_redis(key):
+    async with redis_client.pipeline() as pipe:
+        pipe.get(key)
+        pipe.delete(key)
+        value, _ = await pipe.execute()
+    return value